@@ -1,7 +1,6 @@
 import streamlit as st
-import openai
 from datetime import datetime, timedelta
-import json
+from tenants import clinica_atual, get_registry, LimiteExcedido
 
 # Configuração da página
 st.set_page_config(page_title="Consultório Médico - Agendamento", layout="wide")
@@ -10,61 +9,31 @@ st.set_page_config(page_title="Consultório Médico - Agendamento", layout="wide
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 
-# Simulação de banco de dados de médicos e horários
-DOCTORS_DB = {
-    "Dra. Maria Silva": {
-        "especialidade": "Clínica Geral",
-        "horarios_disponiveis": [
-            "09:00", "10:00", "11:00", "14:00", "15:00", "16:00"
-        ]
-    },
-    "Dr. João Santos": {
-        "especialidade": "Cardiologia",
-        "horarios_disponiveis": [
-            "08:00", "09:00", "10:00", "14:00", "15:00"
-        ]
-    }
-}
-
-# Prompt da persona secretária
-SECRETARY_PROMPT = """Você é a Ana, uma secretária virtual profissional e atenciosa de um consultório médico.
-Suas responsabilidades incluem:
-1. Dar boas-vindas aos pacientes
-2. Auxiliar no agendamento e remarcação de consultas
-3. Informar sobre os médicos disponíveis e suas especialidades
-4. Verificar horários disponíveis
-5. Confirmar agendamentos
-
-Diretrizes de comportamento:
-- Seja sempre cordial e profissional
-- Use linguagem clara e acessível
-- Peça informações necessárias como nome do paciente e preferência de horário
-- Confirme todos os dados antes de finalizar agendamentos
-- Em caso de dúvidas, peça esclarecimentos
-
-Médicos e horários disponíveis:
-{doctors_db}
-
-Por favor, interaja com o paciente seguindo essas diretrizes."""
+# Configuração da clínica (persona, médicos e horários) carregada de clinicas/<id>/
+clinica = clinica_atual("consultorio")
+DOCTORS_DB = clinica.medicos
 
 def get_openai_response(messages):
     """Função para obter resposta do ChatGPT"""
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": SECRETARY_PROMPT.format(doctors_db=json.dumps(DOCTORS_DB, indent=2))},
-                *messages
-            ],
-            temperature=0.7,
-            max_tokens=150
-        )
-        return response.choices[0].message["content"]
+        with get_registry().llm(clinica) as client:
+            response = client.chat.completions.create(
+                model=clinica.modelo,
+                messages=[
+                    {"role": "system", "content": clinica.prompt_sistema},
+                    *messages
+                ],
+                temperature=clinica.temperatura,
+                max_tokens=clinica.max_tokens
+            )
+        return response.choices[0].message.content
+    except LimiteExcedido:
+        return "Estamos com muitas solicitações no momento. Por favor, tente novamente em instantes."
     except Exception as e:
         return f"Desculpe, ocorreu um erro na comunicação. Por favor, tente novamente. Erro: {str(e)}"
 
 # Interface principal
-st.title("🏥 Consultório Médico - Agendamento Online")
+st.title(f"🏥 {clinica.nome} - Agendamento Online")
 st.markdown("---")
 
 # Sidebar com informações dos médicos
@@ -79,7 +48,7 @@ with st.sidebar:
         st.markdown("---")
 
 # Área principal do chat
-st.header("💬 Chat com a Secretária Virtual")
+st.header(f"💬 Chat com a {clinica.persona}")
 
 # Exibir mensagens anteriores
 for message in st.session_state.messages:
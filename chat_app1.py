@@ -1,66 +1,45 @@
 import streamlit as st
-import openai
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from datetime import datetime, timedelta
 import pytz
 import json
 import os
+from tenants import clinica_atual, get_registry, LimiteExcedido, ServicoIndisponivel
 
-# Configurações das APIs
-openai.api_key = st.secrets["OPENAI_API_KEY"]
-
-# Escopo do Google Calendar
-SCOPES = ['https://www.googleapis.com/auth/calendar']
-
-def get_calendar_service():
+def chat_with_gpt(prompt, clinica):
     """
-    Configura e retorna o serviço do Google Calendar usando credenciais do Streamlit secrets.
+    Interage com o modelo configurado para a clínica usando o cliente compartilhado.
     """
     try:
-        # Obter credenciais do Google das secrets do Streamlit
-        creds_info = {
-            "token": st.secrets["GOOGLE_TOKEN"],
-            "refresh_token": st.secrets["GOOGLE_REFRESH_TOKEN"],
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "client_id": st.secrets["GOOGLE_CLIENT_ID"],
-            "client_secret": st.secrets["GOOGLE_CLIENT_SECRET"],
-            "scopes": SCOPES
-        }
-        
-        creds = Credentials.from_authorized_user_info(info=creds_info, scopes=SCOPES)
-        
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                raise Exception("Credenciais inválidas")
-        
-        service = build('calendar', 'v3', credentials=creds)
-        return service
-    
+        with get_registry().llm(clinica) as client:
+            response = client.chat.completions.create(
+                model=clinica.modelo,
+                messages=[
+                    {"role": "system", "content": clinica.prompt_sistema},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=clinica.max_tokens,
+                temperature=clinica.temperatura
+            )
+        return response.choices[0].message.content.strip()
+    except LimiteExcedido:
+        return "Estamos com muitas solicitações no momento. Por favor, tente novamente em instantes."
     except Exception as e:
-        st.error(f"Erro na autenticação: {str(e)}")
-        return None
+        st.error(f"Erro na comunicação com OpenAI: {str(e)}")
+        return "Desculpe, estou com problemas técnicos no momento."
 
-def chat_with_gpt(prompt):
+def usar_calendar(clinica, operacao, *args, padrao=None):
     """
-    Interage com o GPT-3.5 usando a API mais recente.
+    Executa a operação com um serviço do Google Calendar emprestado do pool
+    compartilhado entre as clínicas, devolvendo-o logo em seguida.
     """
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Você é uma secretária virtual de consultório médico, profissional e prestativa."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150,
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        st.error(f"Erro na comunicação com OpenAI: {str(e)}")
-        return "Desculpe, estou com problemas técnicos no momento."
+        with get_registry().calendar(clinica) as service:
+            return operacao(service, *args)
+    except LimiteExcedido:
+        st.error("A agenda está com muitas solicitações no momento. Tente novamente em instantes.")
+    except ServicoIndisponivel as e:
+        st.error(f"Não foi possível conectar ao Google Calendar: {str(e)}")
+    return padrao
 
 def verificar_conflitos(service, start_time, end_time, calendar_id='primary'):
     """
@@ -80,20 +59,19 @@ def verificar_conflitos(service, start_time, end_time, calendar_id='primary'):
         st.error(f"Erro ao verificar conflitos: {str(e)}")
         return True
 
-def marcar_consulta(service, medico, data, hora, paciente):
+def marcar_consulta(service, medico, data, hora, paciente, calendar_id, fuso_horario, duracao_minutos):
     """
     Marca uma consulta no Google Calendar.
     """
     try:
-        # Converter string de data e hora para datetime
+        # Converter string de data e hora para datetime no fuso da clínica
         data_hora = datetime.strptime(f"{data} {hora}", "%Y-%m-%d %H:%M")
-        fuso_horario = pytz.timezone('America/Sao_Paulo')
-        data_hora = fuso_horario.localize(data_hora)
+        data_hora = pytz.timezone(fuso_horario).localize(data_hora)
         
-        fim_consulta = data_hora + timedelta(minutes=30)
+        fim_consulta = data_hora + timedelta(minutes=duracao_minutos)
         
         # Verificar conflitos
-        if verificar_conflitos(service, data_hora, fim_consulta):
+        if verificar_conflitos(service, data_hora, fim_consulta, calendar_id):
             return False, "Horário já ocupado"
         
         evento = {
@@ -101,11 +79,11 @@ def marcar_consulta(service, medico, data, hora, paciente):
             'description': f'Paciente: {paciente}',
             'start': {
                 'dateTime': data_hora.isoformat(),
-                'timeZone': 'America/Sao_Paulo',
+                'timeZone': fuso_horario,
             },
             'end': {
                 'dateTime': fim_consulta.isoformat(),
-                'timeZone': 'America/Sao_Paulo',
+                'timeZone': fuso_horario,
             },
             'reminders': {
                 'useDefault': False,
@@ -116,98 +94,96 @@ def marcar_consulta(service, medico, data, hora, paciente):
             },
         }
         
-        service.events().insert(calendarId='primary', body=evento).execute()
+        service.events().insert(calendarId=calendar_id, body=evento).execute()
         return True, "Consulta marcada com sucesso!"
         
     except Exception as e:
         return False, f"Erro ao marcar consulta: {str(e)}"
 
-def remarcar_consulta(service, event_id, nova_data, nova_hora):
+def remarcar_consulta(service, event_id, nova_data, nova_hora, calendar_id, fuso_horario, duracao_minutos):
     """
     Remarca uma consulta existente para novo horário.
     """
     try:
-        # Converter nova data e hora
+        # Converter nova data e hora no fuso da clínica
         nova_data_hora = datetime.strptime(f"{nova_data} {nova_hora}", "%Y-%m-%d %H:%M")
-        fuso_horario = pytz.timezone('America/Sao_Paulo')
-        nova_data_hora = fuso_horario.localize(nova_data_hora)
-        fim_consulta = nova_data_hora + timedelta(minutes=30)
+        nova_data_hora = pytz.timezone(fuso_horario).localize(nova_data_hora)
+        fim_consulta = nova_data_hora + timedelta(minutes=duracao_minutos)
         
         # Verificar conflitos no novo horário
-        if verificar_conflitos(service, nova_data_hora, fim_consulta):
+        if verificar_conflitos(service, nova_data_hora, fim_consulta, calendar_id):
             return False, "Novo horário já está ocupado"
         
         # Buscar evento existente
-        evento = service.events().get(calendarId='primary', eventId=event_id).execute()
+        evento = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
         
         # Atualizar horários
         evento['start']['dateTime'] = nova_data_hora.isoformat()
+        evento['start']['timeZone'] = fuso_horario
         evento['end']['dateTime'] = fim_consulta.isoformat()
+        evento['end']['timeZone'] = fuso_horario
         
-        service.events().update(calendarId='primary', eventId=event_id, body=evento).execute()
+        service.events().update(calendarId=calendar_id, eventId=event_id, body=evento).execute()
         return True, "Consulta remarcada com sucesso!"
         
     except Exception as e:
         return False, f"Erro ao remarcar consulta: {str(e)}"
 
-def obter_horarios_disponiveis(service, medico, data):
+def obter_horarios_disponiveis(service, medico, data, horarios, calendar_id, fuso_horario, duracao_minutos):
     """
-    Retorna lista de horários disponíveis para uma data específica.
+    Retorna os horários do expediente (lista HH:MM) ainda livres na data especificada.
     """
     try:
-        data_inicio = datetime.strptime(data, "%Y-%m-%d").replace(hour=8, minute=0)  # Início às 8h
-        data_fim = data_inicio.replace(hour=18, minute=0)  # Fim às 18h
-        fuso_horario = pytz.timezone('America/Sao_Paulo')
-        data_inicio = fuso_horario.localize(data_inicio)
-        data_fim = fuso_horario.localize(data_fim)
+        fuso = pytz.timezone(fuso_horario)
+        duracao = timedelta(minutes=duracao_minutos)
+        inicios = [
+            fuso.localize(datetime.strptime(f"{data} {horario}", "%Y-%m-%d %H:%M"))
+            for horario in horarios
+        ]
+        if not inicios:
+            return []
         
-        # Buscar eventos do dia
+        # Buscar eventos do expediente
         events_result = service.events().list(
-            calendarId='primary',
-            timeMin=data_inicio.isoformat(),
-            timeMax=data_fim.isoformat(),
+            calendarId=calendar_id,
+            timeMin=inicios[0].isoformat(),
+            timeMax=(inicios[-1] + duracao).isoformat(),
             singleEvents=True,
             orderBy='startTime'
         ).execute()
         
-        eventos = events_result.get('items', [])
-        horarios_ocupados = set()
-        
-        # Marcar horários ocupados
-        for evento in eventos:
-            inicio = datetime.fromisoformat(evento['start']['dateTime'].replace('Z', '+00:00'))
-            fim = datetime.fromisoformat(evento['end']['dateTime'].replace('Z', '+00:00'))
-            
-            while inicio < fim:
-                horarios_ocupados.add(inicio.strftime("%H:%M"))
-                inicio += timedelta(minutes=30)
-        
-        # Gerar todos os horários possíveis
-        horarios_disponiveis = []
-        hora_atual = data_inicio
+        ocupados = [
+            (
+                datetime.fromisoformat(evento['start']['dateTime'].replace('Z', '+00:00')),
+                datetime.fromisoformat(evento['end']['dateTime'].replace('Z', '+00:00'))
+            )
+            for evento in events_result.get('items', [])
+        ]
         
-        while hora_atual < data_fim:
-            horario = hora_atual.strftime("%H:%M")
-            if horario not in horarios_ocupados:
-                horarios_disponiveis.append(horario)
-            hora_atual += timedelta(minutes=30)
-        
-        return horarios_disponiveis
+        # Um horário está livre se nenhum evento se sobrepõe a ele
+        return [
+            horario
+            for horario, inicio in zip(horarios, inicios)
+            if not any(ocupado_inicio < inicio + duracao and inicio < ocupado_fim
+                       for ocupado_inicio, ocupado_fim in ocupados)
+        ]
         
     except Exception as e:
         st.error(f"Erro ao buscar horários disponíveis: {str(e)}")
         return []
 
 def main():
-    st.title("📅 Agendamento de Consultas Médicas")
+    clinica = clinica_atual("traumatologia")
+    st.title(f"📅 {clinica.nome}")
     
     # Verificar se todas as secrets necessárias estão configuradas
+    prefixo = clinica.calendario["credenciais"]
     required_secrets = [
         "OPENAI_API_KEY",
-        "GOOGLE_TOKEN",
-        "GOOGLE_REFRESH_TOKEN",
-        "GOOGLE_CLIENT_ID",
-        "GOOGLE_CLIENT_SECRET"
+        f"{prefixo}_TOKEN",
+        f"{prefixo}_REFRESH_TOKEN",
+        f"{prefixo}_CLIENT_ID",
+        f"{prefixo}_CLIENT_SECRET"
     ]
     
     missing_secrets = [secret for secret in required_secrets if secret not in st.secrets]
@@ -216,14 +192,12 @@ def main():
         st.info("Configure estas variáveis no arquivo .streamlit/secrets.toml")
         return
     
-    # Inicializar o serviço do Calendar
-    service = get_calendar_service()
-    if not service:
-        st.error("Não foi possível conectar ao Google Calendar")
-        return
+    calendar_id = clinica.calendario["calendar_id"]
+    expediente = clinica.horarios_atendimento()
+    duracao = int(clinica.horario_atendimento["intervalo_minutos"])
     
     # Área de chat
-    st.subheader("💬 Chat com a Secretária Virtual")
+    st.subheader(f"💬 Chat com a {clinica.persona}")
     
     # Inicializar histórico de chat na sessão
     if 'mensagens' not in st.session_state:
@@ -243,7 +217,7 @@ def main():
         
         # Processar input
         prompt = f"Usuário: {user_input}\nPor favor, responda de forma profissional e clara."
-        response = chat_with_gpt(prompt)
+        response = chat_with_gpt(prompt, clinica)
         
         # Adicionar resposta ao histórico
         st.session_state.mensagens.append({"role": "assistant", "content": response})
@@ -255,20 +229,25 @@ def main():
         input_lower = user_input.lower()
         if "agendar" in input_lower or "marcar" in input_lower:
             with st.expander("🗓️ Agendar Nova Consulta"):
-                medicos = ["Dr. Silva", "Dra. Santos", "Dr. Oliveira"]
+                medicos = list(clinica.medicos)
                 medico = st.selectbox("Selecione o médico:", medicos)
                 data = st.date_input("Selecione a data:")
                 
                 if data:
-                    horarios = obter_horarios_disponiveis(service, medico, data.strftime("%Y-%m-%d"))
+                    horarios = usar_calendar(
+                        clinica, obter_horarios_disponiveis,
+                        medico, data.strftime("%Y-%m-%d"), expediente,
+                        calendar_id, clinica.fuso_horario, duracao, padrao=[]
+                    )
                     if horarios:
                         hora = st.selectbox("Horários disponíveis:", horarios)
                         paciente = st.text_input("Nome do paciente:")
                         
                         if st.button("Confirmar Agendamento"):
-                            sucesso, mensagem = marcar_consulta(
-                                service, medico, data.strftime("%Y-%m-%d"), 
-                                hora, paciente
+                            sucesso, mensagem = usar_calendar(
+                                clinica, marcar_consulta, medico, data.strftime("%Y-%m-%d"), 
+                                hora, paciente, calendar_id, clinica.fuso_horario, duracao,
+                                padrao=(False, "Consulta não marcada.")
                             )
                             if sucesso:
                                 st.success(mensagem)
@@ -283,14 +262,19 @@ def main():
                 nova_data = st.date_input("Nova data:")
                 
                 if nova_data:
-                    horarios = obter_horarios_disponiveis(service, "", nova_data.strftime("%Y-%m-%d"))
+                    horarios = usar_calendar(
+                        clinica, obter_horarios_disponiveis,
+                        "", nova_data.strftime("%Y-%m-%d"), expediente,
+                        calendar_id, clinica.fuso_horario, duracao, padrao=[]
+                    )
                     if horarios:
                         nova_hora = st.selectbox("Novo horário:", horarios)
                         
                         if st.button("Confirmar Remarcação"):
-                            sucesso, mensagem = remarcar_consulta(
-                                service, event_id, nova_data.strftime("%Y-%m-%d"), 
-                                nova_hora
+                            sucesso, mensagem = usar_calendar(
+                                clinica, remarcar_consulta, event_id, nova_data.strftime("%Y-%m-%d"), 
+                                nova_hora, calendar_id, clinica.fuso_horario, duracao,
+                                padrao=(False, "Consulta não remarcada.")
                             )
                             if sucesso:
                                 st.success(mensagem)
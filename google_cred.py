@@ -1,23 +1,14 @@
 import streamlit as st
-import openai
 from datetime import datetime, timedelta
 import pytz
 import json
-
-# Configuração da API do OpenAI
-openai.api_key = st.secrets["OPENAI_API_KEY"]
+from tenants import clinica_atual, get_registry, LimiteExcedido
 
 class AgendamentoManager:
-    def __init__(self):
+    def __init__(self, clinica):
+        self.clinica = clinica
         if 'consultas' not in st.session_state:
             st.session_state.consultas = []
-        if 'horarios_disponiveis' not in st.session_state:
-            # Horários de 8h às 18h, a cada 30 minutos
-            st.session_state.horarios_disponiveis = [
-                f"{h:02d}:{m:02d}" 
-                for h in range(8, 18) 
-                for m in [0, 30]
-            ]
     
     def verificar_disponibilidade(self, data, hora):
         """Verifica se o horário está disponível na data especificada"""
@@ -45,7 +36,8 @@ class AgendamentoManager:
     
     def obter_horarios_disponiveis(self, data):
         """Retorna horários disponíveis para a data"""
-        horarios = st.session_state.horarios_disponiveis.copy()
+        # Horários do expediente da clínica (ex.: 8h às 18h, a cada 30 minutos)
+        horarios = self.clinica.horarios_atendimento()
         
         # Remove horários já agendados
         for consulta in st.session_state.consultas:
@@ -57,27 +49,19 @@ class AgendamentoManager:
     def processar_comando_chat(self, mensagem):
         """Processa comandos de agendamento via chat"""
         try:
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """Você é uma secretária virtual de consultório médico.
-                        seu trabalho é sanar dúvidas comuns dos pacientes e fazer agendamento de consultas 
-                        Extraia as informações de agendamento da mensagem do usuário no formato JSON:
+            with get_registry().llm(self.clinica) as client:
+                response = client.chat.completions.create(
+                    model=self.clinica.modelo,
+                    messages=[
                         {
-                            "acao": "agendar" ou "consultar",
-                            "medico": "nome do médico" (se mencionado),
-                            "data": "YYYY-MM-DD" (se mencionada),
-                            "hora": "HH:MM" (se mencionada),
-                            "paciente": "nome do paciente" (se mencionado)
-                        }
-                        Se a mensagem não contiver informações de agendamento, responda normalmente."""
-                    },
-                    {"role": "user", "content": mensagem}
-                ],
-                temperature=0.7
-            )
+                            "role": "system",
+                            "content": self.clinica.prompt_agendamento
+                        },
+                        {"role": "user", "content": mensagem}
+                    ],
+                    temperature=self.clinica.temperatura,
+                    max_tokens=self.clinica.max_tokens
+                )
             
             resposta = response.choices[0].message.content.strip()
             
@@ -110,14 +94,17 @@ class AgendamentoManager:
             except json.JSONDecodeError:
                 return resposta
             
+        except LimiteExcedido:
+            return "Estamos com muitas solicitações no momento. Por favor, tente novamente em instantes."
         except Exception as e:
             return f"Desculpe, ocorreu um erro: {str(e)}"
 
 def main():
-    st.title("📅 Consultas Médicas de Traumatologia")
+    clinica = clinica_atual("traumatologia")
+    st.title(f"📅 {clinica.nome}")
     
     # Inicializar o gerenciador de agendamentos
-    agendamento = AgendamentoManager()
+    agendamento = AgendamentoManager(clinica)
     
     # Área de chat
     st.subheader("💬 Chat com a Secretária Virtual")
@@ -127,7 +114,7 @@ def main():
         st.session_state.mensagens = [
             {
                 "role": "assistant",
-                "content": """Olá! Sou a secretária virtual do consultório. 
+                "content": f"""{clinica.saudacao}
                 Posso ajudar você a:
                 
                 - Sanara Dúvidas
@@ -0,0 +1,446 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from queue import Empty, Queue
+
+import pytz
+import streamlit as st
+from openai import OpenAI
+from dotenv import load_dotenv
+load_dotenv()
+
+# Pasta com uma subpasta por clínica: clinicas/<id>/config.json (+ prompt.txt opcional)
+CLINICAS_DIR = os.environ.get("CLINICAS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "clinicas"))
+# Clínica usada quando a URL não traz ?clinica=; sem ela, vale o padrão de cada app
+CLINICA_PADRAO = os.environ.get("CLINICA_ID")
+
+# Limites globais compartilhados entre todas as clínicas
+MAX_CHAMADAS_LLM = int(os.environ.get("MAX_CHAMADAS_LLM", "8"))
+MAX_CONEXOES_CALENDAR = int(os.environ.get("MAX_CONEXOES_CALENDAR", "4"))
+TEMPO_MAXIMO_FILA = float(os.environ.get("TEMPO_MAXIMO_FILA", "30"))
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+# Instruções de extração adicionadas ao prompt da persona nos apps que agendam pelo chat
+INSTRUCOES_AGENDAMENTO = """Caso haja pedido de agendamento, extraia as informações de agendamento da mensagem do usuário no formato JSON:
+{
+    "acao": "agendar" ou "consultar",
+    "medico": "nome do médico" (se mencionado),
+    "data": "YYYY-MM-DD" (se mencionada),
+    "hora": "HH:MM" (se mencionada),
+    "paciente": "nome do paciente" (se mencionado)
+}
+Se a mensagem não contiver informações de agendamento, responda normalmente."""
+
+CONFIG_PADRAO = {
+    "persona": "secretária virtual",
+    "saudacao": "Olá! Sou a secretária virtual do consultório. Como posso te ajudar?",
+    "modelo": "gpt-4o-mini",
+    "temperatura": 0.7,
+    "max_tokens": None,
+    "medicos": {},
+    "horario_atendimento": {"inicio": "08:00", "fim": "18:00", "intervalo_minutos": 30},
+    "fuso_horario": "America/Sao_Paulo",
+    "calendario": {"calendar_id": "primary", "credenciais": "GOOGLE"},
+    "limites": {"requisicoes_por_minuto": 30, "concorrencia": 2},
+    # Usado quando a clínica não tem prompt.txt
+    "prompt": """Seu nome é {persona} e você é a secretária virtual do consultório médico "{nome}".
+Seu trabalho é sanar dúvidas comuns dos pacientes e fazer agendamento de consultas.
+
+Médicos e horários disponíveis:
+{medicos}
+
+Seja cordial e empática, responda de forma concisa e apenas em português brasileiro.""",
+}
+
+
+class ErroClinica(Exception):
+    """Clínica indisponível: não encontrada ou com configuração inválida"""
+
+
+class ClinicaNaoEncontrada(ErroClinica, KeyError):
+    """Nenhuma configuração encontrada para o id de clínica informado"""
+
+
+class ConfiguracaoInvalida(ErroClinica):
+    """Os arquivos da clínica existem, mas não puderam ser lidos ou são inválidos"""
+
+
+class LimiteExcedido(RuntimeError):
+    """A clínica excedeu seu limite de requisições ou o tempo máximo na fila"""
+
+
+class ServicoIndisponivel(RuntimeError):
+    """Não foi possível criar um cliente do pool (ex.: falha na autenticação)"""
+
+
+class Clinica:
+    """Configuração de uma clínica carregada de clinicas/<id>/"""
+
+    def __init__(self, clinica_id, config, prompt=None):
+        dados = {**CONFIG_PADRAO, **config}
+        self.id = clinica_id
+        self.nome = dados["nome"]
+        self.persona = dados["persona"]
+        self.saudacao = dados["saudacao"]
+        self.modelo = dados["modelo"]
+        self.temperatura = dados["temperatura"]
+        self.max_tokens = dados["max_tokens"]
+        self.medicos = dict(dados["medicos"])
+        for nome, medico in self.medicos.items():
+            if (not isinstance(medico, dict)
+                    or not isinstance(medico.get("especialidade"), str)
+                    or not isinstance(medico.get("horarios_disponiveis"), list)
+                    or not all(isinstance(h, str) for h in medico["horarios_disponiveis"])):
+                raise ValueError(f"Médico '{nome}' precisa de 'especialidade' e 'horarios_disponiveis' (lista de HH:MM)")
+        self.horario_atendimento = {**CONFIG_PADRAO["horario_atendimento"], **dados["horario_atendimento"]}
+        self.fuso_horario = dados["fuso_horario"]
+        pytz.timezone(self.fuso_horario)  # valida o fuso no carregamento
+        self.calendario = {**CONFIG_PADRAO["calendario"], **dados["calendario"]}
+        self.limites = {**CONFIG_PADRAO["limites"], **dados["limites"]}
+        self.limites["requisicoes_por_minuto"] = float(self.limites["requisicoes_por_minuto"])
+        self.limites["concorrencia"] = int(self.limites["concorrencia"])
+        # Preenchido no carregamento: um template inválido falha aqui, não a cada requisição
+        self.prompt_sistema = (prompt or dados["prompt"]).format(
+            nome=self.nome,
+            persona=self.persona,
+            medicos=json.dumps(self.medicos, indent=2, ensure_ascii=False),
+        )
+        self.prompt_agendamento = f"{self.prompt_sistema.rstrip()}\n\n{INSTRUCOES_AGENDAMENTO}"
+
+    def horarios_atendimento(self):
+        """Lista de horários (HH:MM) entre o início e o fim do expediente"""
+        inicio_h, inicio_m = map(int, self.horario_atendimento["inicio"].split(":"))
+        fim_h, fim_m = map(int, self.horario_atendimento["fim"].split(":"))
+        passo = int(self.horario_atendimento["intervalo_minutos"])
+        if passo <= 0:
+            raise ValueError("intervalo_minutos deve ser positivo")
+        return [
+            f"{minuto // 60:02d}:{minuto % 60:02d}"
+            for minuto in range(inicio_h * 60 + inicio_m, fim_h * 60 + fim_m, passo)
+        ]
+
+
+class RateLimiter:
+    """Token bucket por clínica (requisições por minuto)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._baldes = {}
+
+    def tentar(self, chave, por_minuto):
+        """Consome um token da clínica; retorna False se o limite foi atingido"""
+        agora = time.monotonic()
+        with self._lock:
+            tokens, ultimo = self._baldes.get(chave, (float(por_minuto), agora))
+            tokens = min(float(por_minuto), tokens + (agora - ultimo) * por_minuto / 60.0)
+            if tokens < 1:
+                self._baldes[chave] = (tokens, agora)
+                return False
+            self._baldes[chave] = (tokens - 1, agora)
+            return True
+
+
+class FairScheduler:
+    """
+    Fila justa (round-robin) para um recurso com número limitado de vagas.
+    Cada clínica tem sua própria fila; as vagas livres são distribuídas
+    alternando entre as clínicas, de modo que uma clínica movimentada não
+    impede as demais de serem atendidas.
+    """
+
+    def __init__(self, max_vagas):
+        self.max_vagas = max_vagas
+        self._cond = threading.Condition()
+        self._filas = OrderedDict()
+        self._em_uso = {}
+        self._limites = {}
+        self._total_em_uso = 0
+
+    def _proximo(self):
+        # Primeiro ticket da primeira clínica do rodízio que ainda não atingiu sua concorrência
+        for chave, fila in self._filas.items():
+            if self._em_uso.get(chave, 0) < self._limites.get(chave, self.max_vagas):
+                return fila[0]
+        return None
+
+    @contextmanager
+    def vaga(self, chave, concorrencia=None, timeout=None):
+        """Bloqueia até haver uma vaga para a clínica e a libera ao sair"""
+        ticket = object()
+        prazo = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._filas.setdefault(chave, deque()).append(ticket)
+            if concorrencia is not None:
+                self._limites[chave] = concorrencia
+            while True:
+                if self._total_em_uso < self.max_vagas and self._proximo() is ticket:
+                    break
+                restante = None if prazo is None else prazo - time.monotonic()
+                if restante is not None and restante <= 0:
+                    self._filas[chave].remove(ticket)
+                    if not self._filas[chave]:
+                        del self._filas[chave]
+                    self._cond.notify_all()
+                    raise LimiteExcedido(f"Tempo de espera esgotado para a clínica '{chave}'")
+                self._cond.wait(restante)
+
+            # Ticket atendido: a clínica vai para o fim do rodízio
+            fila = self._filas.pop(chave)
+            fila.popleft()
+            if fila:
+                self._filas[chave] = fila
+            self._em_uso[chave] = self._em_uso.get(chave, 0) + 1
+            self._total_em_uso += 1
+            # A cabeça do rodízio mudou: outras clínicas podem ter vaga agora
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._em_uso[chave] -= 1
+                self._total_em_uso -= 1
+                self._cond.notify_all()
+
+
+class ClientPool:
+    """Pool de clientes reutilizáveis que não devem ser usados por duas threads ao mesmo tempo"""
+
+    def __init__(self, fabrica, tamanho):
+        self._fabrica = fabrica
+        self._livres = Queue()
+        self._lock = threading.Lock()
+        self._criados = 0
+        self.tamanho = tamanho
+
+    @contextmanager
+    def cliente(self, timeout=None):
+        try:
+            cliente = self._livres.get_nowait()
+        except Empty:
+            with self._lock:
+                criar = self._criados < self.tamanho
+                if criar:
+                    self._criados += 1
+            if criar:
+                try:
+                    cliente = self._fabrica()
+                except Exception as e:
+                    with self._lock:
+                        self._criados -= 1
+                    raise ServicoIndisponivel(str(e)) from e
+            else:
+                try:
+                    cliente = self._livres.get(timeout=timeout)
+                except Empty:
+                    raise LimiteExcedido("Nenhuma conexão disponível no momento")
+        try:
+            yield cliente
+        finally:
+            self._livres.put(cliente)
+
+
+class TenantRegistry:
+    """
+    Registro das clínicas hospedadas. As configurações ficam em cache e são
+    recarregadas automaticamente quando os arquivos da clínica mudam.
+    Os clientes OpenAI e Google Calendar são compartilhados entre as clínicas.
+    """
+
+    def __init__(self, diretorio=CLINICAS_DIR, intervalo_recarga=2.0):
+        self.diretorio = diretorio
+        self.intervalo_recarga = intervalo_recarga
+        self._lock = threading.Lock()
+        self._cache = {}  # id -> (assinatura dos arquivos, última Clinica válida, erro, última verificação)
+        self._locks = {}  # id -> lock da clínica, usado durante a leitura dos arquivos
+        self._openai = None
+        self._calendarios = {}
+        self._rate_limiter = RateLimiter()
+        self._fila_llm = FairScheduler(MAX_CHAMADAS_LLM)
+        self._fila_calendar = FairScheduler(MAX_CONEXOES_CALENDAR)
+
+    # Configuração das clínicas
+
+    def _arquivos(self, clinica_id):
+        pasta = os.path.join(self.diretorio, clinica_id)
+        return os.path.join(pasta, "config.json"), os.path.join(pasta, "prompt.txt")
+
+    def _assinatura(self, clinica_id):
+        assinatura = []
+        for caminho in self._arquivos(clinica_id):
+            try:
+                st_arquivo = os.stat(caminho)
+                assinatura.append((st_arquivo.st_mtime_ns, st_arquivo.st_size))
+            except FileNotFoundError:
+                assinatura.append(None)
+        return tuple(assinatura)
+
+    def _carregar(self, clinica_id):
+        caminho_config, caminho_prompt = self._arquivos(clinica_id)
+        try:
+            with open(caminho_config, encoding="utf-8") as f:
+                config = json.load(f)
+            prompt = None
+            if os.path.exists(caminho_prompt):
+                with open(caminho_prompt, encoding="utf-8") as f:
+                    prompt = f.read()
+            clinica = Clinica(clinica_id, config, prompt)
+            clinica.horarios_atendimento()
+        except (OSError, ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            raise ConfiguracaoInvalida(f"Configuração inválida da clínica '{clinica_id}': {e}") from e
+        return clinica
+
+    def listar(self):
+        """Ids de todas as clínicas disponíveis"""
+        if not os.path.isdir(self.diretorio):
+            return []
+        return sorted(
+            nome for nome in os.listdir(self.diretorio)
+            if os.path.isfile(os.path.join(self.diretorio, nome, "config.json"))
+        )
+
+    def _lock_clinica(self, clinica_id):
+        with self._lock:
+            return self._locks.setdefault(clinica_id, threading.Lock())
+
+    @staticmethod
+    def _resultado(entrada):
+        _, clinica, erro, _ = entrada
+        if clinica is None:
+            raise ConfiguracaoInvalida(erro)
+        return clinica
+
+    def get(self, clinica_id):
+        """Retorna a configuração da clínica, recarregando-a se os arquivos mudaram"""
+        if not clinica_id or os.path.basename(clinica_id) != clinica_id or clinica_id.startswith("."):
+            raise ClinicaNaoEncontrada(clinica_id)
+
+        em_cache = self._cache.get(clinica_id)
+        if em_cache and time.monotonic() - em_cache[3] < self.intervalo_recarga:
+            return self._resultado(em_cache)
+        if em_cache is None and not os.path.isfile(self._arquivos(clinica_id)[0]):
+            raise ClinicaNaoEncontrada(clinica_id)
+
+        # Arquivos lidos só com o lock da própria clínica: uma clínica lenta
+        # ou com configuração quebrada não segura as requisições das outras
+        with self._lock_clinica(clinica_id):
+            agora = time.monotonic()
+            em_cache = self._cache.get(clinica_id)
+            if em_cache and agora - em_cache[3] < self.intervalo_recarga:
+                return self._resultado(em_cache)
+
+            assinatura = self._assinatura(clinica_id)
+            if assinatura[0] is None:
+                self._cache.pop(clinica_id, None)
+                raise ClinicaNaoEncontrada(clinica_id)
+            if em_cache and em_cache[0] == assinatura:
+                em_cache = (assinatura, em_cache[1], em_cache[2], agora)
+            else:
+                try:
+                    em_cache = (assinatura, self._carregar(clinica_id), None, agora)
+                except ConfiguracaoInvalida as e:
+                    # Arquivo em edição ou inválido: mantém a última versão válida
+                    # e só tenta ler de novo quando os arquivos mudarem
+                    em_cache = (assinatura, em_cache[1] if em_cache else None, str(e), agora)
+            self._cache[clinica_id] = em_cache
+            return self._resultado(em_cache)
+
+    # Recursos compartilhados
+
+    @property
+    def openai(self):
+        """Cliente OpenAI único (thread-safe) compartilhado por todas as clínicas"""
+        with self._lock:
+            if self._openai is None:
+                self._openai = OpenAI(api_key=_openai_api_key())
+            return self._openai
+
+    @contextmanager
+    def llm(self, clinica):
+        """
+        Reserva uma chamada ao LLM para a clínica, respeitando o limite de
+        requisições por minuto e a fila justa entre clínicas.
+        """
+        if not self._rate_limiter.tentar(clinica.id, clinica.limites["requisicoes_por_minuto"]):
+            raise LimiteExcedido(f"Limite de requisições excedido para a clínica '{clinica.id}'")
+        with self._fila_llm.vaga(clinica.id, clinica.limites["concorrencia"], TEMPO_MAXIMO_FILA):
+            yield self.openai
+
+    def _pool_calendario(self, prefixo):
+        with self._lock:
+            pool = self._calendarios.get(prefixo)
+            if pool is None:
+                pool = ClientPool(lambda: _criar_servico_calendar(prefixo), MAX_CONEXOES_CALENDAR)
+                self._calendarios[prefixo] = pool
+            return pool
+
+    @contextmanager
+    def calendar(self, clinica):
+        """
+        Empresta um serviço do Google Calendar do pool das credenciais da
+        clínica. Clínicas com as mesmas credenciais compartilham o pool;
+        segure-o apenas durante as chamadas à API.
+        """
+        pool = self._pool_calendario(clinica.calendario["credenciais"])
+        with self._fila_calendar.vaga(clinica.id, clinica.limites["concorrencia"], TEMPO_MAXIMO_FILA):
+            with pool.cliente(TEMPO_MAXIMO_FILA) as service:
+                yield service
+
+
+def _openai_api_key():
+    """Chave da OpenAI do .env/ambiente ou, se ausente, das secrets do Streamlit"""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if api_key:
+        return api_key
+    try:
+        return st.secrets["OPENAI_API_KEY"]
+    except Exception:
+        return None
+
+
+def _criar_servico_calendar(prefixo):
+    """Cria o serviço do Google Calendar a partir das secrets <prefixo>_TOKEN, <prefixo>_CLIENT_ID..."""
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+
+    creds_info = {
+        "token": st.secrets[f"{prefixo}_TOKEN"],
+        "refresh_token": st.secrets[f"{prefixo}_REFRESH_TOKEN"],
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": st.secrets[f"{prefixo}_CLIENT_ID"],
+        "client_secret": st.secrets[f"{prefixo}_CLIENT_SECRET"],
+        "scopes": SCOPES
+    }
+    creds = Credentials.from_authorized_user_info(info=creds_info, scopes=SCOPES)
+    if not creds.valid:
+        if creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            raise Exception("Credenciais inválidas")
+    return build('calendar', 'v3', credentials=creds, cache_discovery=False)
+
+
+@st.cache_resource
+def get_registry():
+    """Registro único por processo, compartilhado entre todas as sessões do Streamlit"""
+    return TenantRegistry()
+
+
+def clinica_atual(padrao):
+    """
+    Clínica da sessão, escolhida pelo parâmetro ?clinica= da URL, pela
+    variável CLINICA_ID ou, na falta de ambos, pelo padrão do app.
+    Se a clínica não estiver disponível, mostra o erro e interrompe a página.
+    """
+    clinica_id = st.query_params.get("clinica") or CLINICA_PADRAO or padrao
+    try:
+        return get_registry().get(clinica_id)
+    except ClinicaNaoEncontrada:
+        st.error("Clínica não encontrada.")
+    except ErroClinica:
+        st.error("A configuração desta clínica está indisponível no momento. Tente novamente mais tarde.")
+    st.stop()
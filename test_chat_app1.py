@@ -0,0 +1,43 @@
+from chat_app1 import obter_horarios_disponiveis
+
+
+class CalendarFalso:
+    """Imita service.events().list(...).execute() com eventos fixos"""
+
+    def __init__(self, eventos):
+        self.eventos = eventos
+        self.consultas = []
+
+    def events(self):
+        return self
+
+    def list(self, **kwargs):
+        self.consultas.append(kwargs)
+        return self
+
+    def execute(self):
+        return {"items": self.eventos}
+
+
+def _evento(inicio, fim):
+    return {"start": {"dateTime": inicio}, "end": {"dateTime": fim}}
+
+
+def test_horarios_seguem_expediente_e_fuso_da_clinica():
+    # 07:00-19:00 a cada 45 min em Manaus (UTC-4); evento das 08:00 às 09:00 locais
+    expediente = ["07:00", "07:45", "08:30", "09:15", "18:00"]
+    service = CalendarFalso([_evento("2024-05-10T12:00:00Z", "2024-05-10T13:00:00Z")])
+
+    livres = obter_horarios_disponiveis(
+        service, "Dr. X", "2024-05-10", expediente, "primary", "America/Manaus", 45
+    )
+
+    assert livres == ["07:00", "09:15", "18:00"]
+    assert service.consultas[0]["timeMin"] == "2024-05-10T07:00:00-04:00"
+    assert service.consultas[0]["timeMax"] == "2024-05-10T18:45:00-04:00"
+
+
+def test_horarios_sem_expediente():
+    service = CalendarFalso([])
+    assert obter_horarios_disponiveis(service, "", "2024-05-10", [], "primary", "America/Sao_Paulo", 30) == []
+    assert service.consultas == []
@@ -0,0 +1,412 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import tenants
+from tenants import (
+    ClientPool,
+    ClinicaNaoEncontrada,
+    ConfiguracaoInvalida,
+    FairScheduler,
+    LimiteExcedido,
+    RateLimiter,
+    ServicoIndisponivel,
+    TenantRegistry,
+)
+
+
+def _esperar(condicao, timeout=2.0):
+    prazo = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < prazo, "condição não atingida a tempo"
+        time.sleep(0.005)
+
+
+def _criar_clinica(diretorio, clinica_id, config=None, prompt=None):
+    pasta = diretorio / clinica_id
+    pasta.mkdir(exist_ok=True)
+    caminho = pasta / "config.json"
+    if isinstance(config, str):
+        caminho.write_text(config, encoding="utf-8")
+    else:
+        caminho.write_text(json.dumps(config or {"nome": f"Clínica {clinica_id}"}), encoding="utf-8")
+    if prompt is not None:
+        (pasta / "prompt.txt").write_text(prompt, encoding="utf-8")
+    # Garante assinatura diferente mesmo em sistemas de arquivos com mtime grosseiro
+    for arquivo in pasta.iterdir():
+        estado = arquivo.stat()
+        os.utime(arquivo, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10**9))
+    return pasta
+
+
+MEDICOS = {"Dr. X": {"especialidade": "Clínica Geral", "horarios_disponiveis": ["09:00"]}}
+
+
+# RateLimiter
+
+def test_rate_limiter_bloqueia_e_reabastece(monkeypatch):
+    agora = [100.0]
+    monkeypatch.setattr(tenants.time, "monotonic", lambda: agora[0])
+    limiter = RateLimiter()
+
+    assert [limiter.tentar("a", 3) for _ in range(4)] == [True, True, True, False]
+    # Outra clínica tem seu próprio balde
+    assert limiter.tentar("b", 3)
+
+    agora[0] += 20  # 3 por minuto -> 1 token a cada 20 s
+    assert limiter.tentar("a", 3)
+    assert not limiter.tentar("a", 3)
+
+    agora[0] += 600  # nunca acumula além da capacidade
+    assert [limiter.tentar("a", 3) for _ in range(4)] == [True, True, True, False]
+
+
+# FairScheduler
+
+def _tickets_na_fila(fila, chave):
+    """Quantos pedidos da clínica aguardam vaga"""
+    return len(fila._filas.get(chave, ()))
+
+
+class LockComAtraso:
+    """Lock que atrasa a reaquisição para as threads listadas em `atrasar`"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.atrasar = set()
+
+    def acquire(self, blocking=True, timeout=-1):
+        if threading.current_thread().name in self.atrasar:
+            time.sleep(0.2)
+        return self._lock.acquire(blocking, timeout)
+
+    def release(self):
+        self._lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def _scheduler_com_lock_atrasado(max_vagas):
+    """Scheduler cujo lock atrasa a reaquisição das threads em lock.atrasar"""
+    lock = LockComAtraso()
+    fila = FairScheduler(max_vagas)
+    fila._cond = threading.Condition(lock)
+    return fila, lock
+
+
+def test_scheduler_alterna_entre_clinicas():
+    fila = FairScheduler(1)
+    ordem = []
+
+    def cliente(chave):
+        with fila.vaga(chave, timeout=5):
+            ordem.append(chave)
+
+    threads = []
+    with fila.vaga("X"):
+        for i in range(4):
+            threads.append(threading.Thread(target=cliente, args=("A",)))
+            threads[-1].start()
+            _esperar(lambda: _tickets_na_fila(fila, "A") == i + 1)
+        threads.append(threading.Thread(target=cliente, args=("B",)))
+        threads[-1].start()
+        _esperar(lambda: _tickets_na_fila(fila, "B"))
+    for thread in threads:
+        thread.join(5)
+
+    assert ordem == ["A", "B", "A", "A", "A"]
+
+
+def test_scheduler_timeout_remove_ticket():
+    fila = FairScheduler(1)
+    with fila.vaga("A"):
+        inicio = time.monotonic()
+        with pytest.raises(LimiteExcedido):
+            with fila.vaga("B", timeout=0.1):
+                pass
+        assert time.monotonic() - inicio < 1
+        assert _tickets_na_fila(fila, "B") == 0
+    # A vaga continua utilizável depois do timeout
+    with fila.vaga("B", timeout=0.1):
+        pass
+
+
+def test_scheduler_respeita_concorrencia_por_clinica():
+    fila = FairScheduler(3)
+    atendida = threading.Event()
+
+    def segunda_de_a():
+        with fila.vaga("A", 1, timeout=5):
+            atendida.set()
+
+    with fila.vaga("A", 1):
+        thread = threading.Thread(target=segunda_de_a)
+        thread.start()
+        _esperar(lambda: _tickets_na_fila(fila, "A"))
+
+        # A está no limite e na frente do rodízio, mas não impede B
+        with fila.vaga("B", 1, timeout=0.2):
+            pass
+        assert not atendida.is_set()
+    thread.join(5)
+    assert atendida.is_set()
+
+
+def test_scheduler_acorda_outra_clinica_apos_concessao():
+    # Duas vagas liberadas de uma vez: B reavalia a fila antes de A ser
+    # atendida (A ainda é a primeira do rodízio) e volta a dormir; a
+    # concessão de A precisa acordá-la, senão B só sai no timeout.
+    fila, lock = _scheduler_com_lock_atrasado(2)
+    ocupadas = [fila.vaga("X"), fila.vaga("X")]
+    for vaga in ocupadas:
+        vaga.__enter__()
+
+    resultado = {}
+    libera_a = threading.Event()
+
+    def cliente(chave):
+        inicio = time.monotonic()
+        try:
+            with fila.vaga(chave, timeout=1.0):
+                resultado[chave] = time.monotonic() - inicio
+                if chave == "A":
+                    libera_a.wait(2)
+        except LimiteExcedido:
+            resultado[chave] = "timeout"
+
+    thread_a = threading.Thread(target=cliente, args=("A",), name="A")
+    thread_b = threading.Thread(target=cliente, args=("B",), name="B")
+    thread_a.start()
+    _esperar(lambda: _tickets_na_fila(fila, "A"))
+    thread_b.start()
+    _esperar(lambda: _tickets_na_fila(fila, "B"))
+
+    lock.atrasar.add("A")
+    for vaga in ocupadas:
+        vaga.__exit__(None, None, None)
+
+    thread_b.join(3)
+    libera_a.set()
+    thread_a.join(3)
+
+    assert resultado["B"] != "timeout"
+    assert resultado["B"] < 0.8
+
+
+# ClientPool
+
+def test_pool_reutiliza_clientes():
+    criados = []
+    pool = ClientPool(lambda: criados.append(object()) or criados[-1], 2)
+    with pool.cliente() as primeiro:
+        pass
+    with pool.cliente() as segundo:
+        pass
+    assert primeiro is segundo
+    assert len(criados) == 1
+
+
+def test_pool_esgotado():
+    pool = ClientPool(object, 1)
+    with pool.cliente():
+        with pytest.raises(LimiteExcedido):
+            with pool.cliente(timeout=0.05):
+                pass
+    with pool.cliente(timeout=0.05):
+        pass
+
+
+def test_pool_falha_na_criacao_libera_a_vaga():
+    tentativas = []
+
+    def fabrica():
+        tentativas.append(1)
+        if len(tentativas) == 1:
+            raise ValueError("credenciais inválidas")
+        return object()
+
+    pool = ClientPool(fabrica, 1)
+    with pytest.raises(ServicoIndisponivel):
+        with pool.cliente():
+            pass
+    with pool.cliente(timeout=0.05) as cliente:
+        assert cliente is not None
+
+
+# TenantRegistry
+
+def test_registry_carrega_clinica_com_padroes(tmp_path):
+    _criar_clinica(tmp_path, "a", {"nome": "Clínica A", "persona": "Bia", "medicos": MEDICOS})
+    _criar_clinica(tmp_path, "b")
+    registry = TenantRegistry(tmp_path, intervalo_recarga=0)
+
+    clinica = registry.get("a")
+    assert registry.listar() == ["a", "b"]
+    assert clinica.modelo == tenants.CONFIG_PADRAO["modelo"]
+    assert clinica.horarios_atendimento()[:2] == ["08:00", "08:30"]
+    assert registry.get("a") is clinica
+
+
+def test_registry_prompt_padrao_sem_prompt_txt(tmp_path):
+    _criar_clinica(tmp_path, "a", {"nome": "Clínica A", "persona": "Bia", "medicos": MEDICOS})
+    clinica = TenantRegistry(tmp_path).get("a")
+    assert "Bia" in clinica.prompt_sistema
+    assert "Clínica A" in clinica.prompt_sistema
+    assert "Dr. X" in clinica.prompt_sistema
+    assert clinica.prompt_agendamento.count('"acao"') == 1
+
+
+def test_registry_recarrega_quando_arquivos_mudam(tmp_path):
+    _criar_clinica(tmp_path, "a", {"nome": "Antiga"}, "Sou {persona}")
+    registry = TenantRegistry(tmp_path, intervalo_recarga=0)
+    assert registry.get("a").nome == "Antiga"
+
+    _criar_clinica(tmp_path, "a", {"nome": "Nova", "persona": "Bia"}, "Sou {persona}")
+    clinica = registry.get("a")
+    assert clinica.nome == "Nova"
+    assert clinica.prompt_sistema == "Sou Bia"
+
+
+def test_registry_respeita_intervalo_de_recarga(tmp_path):
+    _criar_clinica(tmp_path, "a", {"nome": "Antiga"})
+    registry = TenantRegistry(tmp_path, intervalo_recarga=60)
+    registry.get("a")
+    _criar_clinica(tmp_path, "a", {"nome": "Nova"})
+    assert registry.get("a").nome == "Antiga"
+
+
+@pytest.mark.parametrize("config, prompt", [
+    ("{invalido", None),
+    ({"nome": "A", "calendario": None}, None),
+    ({"nome": "A", "horario_atendimento": {"inicio": "oito"}}, None),
+    ({"nome": "A", "horario_atendimento": {"intervalo_minutos": 0}}, None),
+    ({"nome": "A", "fuso_horario": "America/Atlantida"}, None),
+    ({"nome": "A", "medicos": {"Dr. X": {}}}, None),
+    ({"nome": "A", "medicos": {"Dr. X": {"especialidade": "Cardiologia", "horarios_disponiveis": "09:00"}}}, None),
+    ({"nome": "A", "medicos": {"Dr. X": None}}, None),
+    ({"persona": "sem nome"}, None),
+    ({"nome": "A"}, '{"acao": "agendar"}'),
+])
+def test_registry_mantem_ultima_versao_valida(tmp_path, config, prompt):
+    _criar_clinica(tmp_path, "a", {"nome": "Válida"})
+    registry = TenantRegistry(tmp_path, intervalo_recarga=0)
+    valida = registry.get("a")
+
+    _criar_clinica(tmp_path, "a", config, prompt)
+    assert registry.get("a") is valida
+
+
+@pytest.mark.parametrize("config, prompt", [
+    ("{invalido", None),
+    ({"nome": "A", "limites": None}, None),
+    ({"nome": "A"}, "{0}"),
+])
+def test_registry_configuracao_invalida_no_primeiro_carregamento(tmp_path, config, prompt):
+    _criar_clinica(tmp_path, "a", config, prompt)
+    with pytest.raises(ConfiguracaoInvalida):
+        TenantRegistry(tmp_path).get("a")
+
+
+def _contar_leituras(registry, monkeypatch, antes=None):
+    leituras = []
+    carregar = registry._carregar
+
+    def carregar_contando(clinica_id):
+        leituras.append(clinica_id)
+        if antes:
+            antes(clinica_id)
+        return carregar(clinica_id)
+
+    monkeypatch.setattr(registry, "_carregar", carregar_contando)
+    return leituras
+
+
+def test_registry_le_arquivo_quebrado_uma_vez_por_alteracao(tmp_path, monkeypatch):
+    _criar_clinica(tmp_path, "a", {"nome": "Válida"})
+    registry = TenantRegistry(tmp_path, intervalo_recarga=0)
+    valida = registry.get("a")
+    leituras = _contar_leituras(registry, monkeypatch)
+
+    _criar_clinica(tmp_path, "a", "{invalido")
+    assert all(registry.get("a") is valida for _ in range(5))
+    assert len(leituras) == 1
+
+    _criar_clinica(tmp_path, "a", {"nome": "Corrigida"})
+    assert registry.get("a").nome == "Corrigida"
+    assert len(leituras) == 2
+
+
+def test_registry_falha_no_primeiro_carregamento_respeita_intervalo(tmp_path, monkeypatch):
+    _criar_clinica(tmp_path, "a", "{invalido")
+    registry = TenantRegistry(tmp_path, intervalo_recarga=60)
+    leituras = _contar_leituras(registry, monkeypatch)
+    for _ in range(5):
+        with pytest.raises(ConfiguracaoInvalida):
+            registry.get("a")
+    assert len(leituras) == 1
+
+
+def test_registry_leitura_lenta_nao_trava_outras_clinicas(tmp_path, monkeypatch):
+    _criar_clinica(tmp_path, "a")
+    _criar_clinica(tmp_path, "b", {"nome": "B"})
+    registry = TenantRegistry(tmp_path, intervalo_recarga=0)
+    registry.get("b")
+    lendo, liberar = threading.Event(), threading.Event()
+
+    def segurar_a(clinica_id):
+        if clinica_id == "a":
+            lendo.set()
+            liberar.wait(5)
+
+    _contar_leituras(registry, monkeypatch, segurar_a)
+    thread = threading.Thread(target=registry.get, args=("a",))
+    thread.start()
+    assert lendo.wait(5)
+
+    inicio = time.monotonic()
+    assert registry.get("b").nome == "B"
+    assert time.monotonic() - inicio < 1
+
+    liberar.set()
+    thread.join(5)
+    assert registry.get("a").id == "a"
+
+
+@pytest.mark.parametrize("clinica_id", ["", "inexistente", "../a", "a/..", ".oculta", "a/b"])
+def test_registry_rejeita_ids_invalidos(tmp_path, clinica_id):
+    _criar_clinica(tmp_path, "a")
+    (tmp_path / ".oculta").mkdir()
+    (tmp_path / ".oculta" / "config.json").write_text('{"nome": "x"}', encoding="utf-8")
+    with pytest.raises(ClinicaNaoEncontrada):
+        TenantRegistry(tmp_path).get(clinica_id)
+
+
+def test_registry_clinica_removida(tmp_path):
+    pasta = _criar_clinica(tmp_path, "a")
+    registry = TenantRegistry(tmp_path, intervalo_recarga=0)
+    registry.get("a")
+    (pasta / "config.json").unlink()
+    with pytest.raises(ClinicaNaoEncontrada):
+        registry.get("a")
+
+
+def test_registry_limite_de_requisicoes_por_clinica(tmp_path):
+    _criar_clinica(tmp_path, "a", {"nome": "A", "limites": {"requisicoes_por_minuto": 1}})
+    _criar_clinica(tmp_path, "b", {"nome": "B", "limites": {"requisicoes_por_minuto": 1}})
+    registry = TenantRegistry(tmp_path)
+    a, b = registry.get("a"), registry.get("b")
+    registry._openai = object()  # o limite é verificado antes de qualquer chamada à API
+
+    with registry.llm(a) as cliente:
+        assert cliente is registry.openai
+    with pytest.raises(LimiteExcedido):
+        with registry.llm(a):
+            pass
+    with registry.llm(b) as cliente:
+        assert cliente is registry.openai